@@ -1,10 +1,19 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import hashlib
 import json
 import random
+import re
 import time
 import os
 import signal
 import sys
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
 from typing import Dict, List, Optional
 
 # Try to load environment variables from .env file
@@ -15,25 +24,441 @@ except ImportError:
     print("python-dotenv not installed. Using default values or environment variables.")
     print("To install: pip install python-dotenv")
 
+# orjson parses and serializes JSON several times faster than the json module
+try:
+    import orjson
+except ImportError:
+    orjson = None
+    print("orjson not installed. Falling back to the json module.")
+    print("To install: pip install orjson")
+
+# Cached Ollama responses older than this are ignored and regenerated
+CACHE_TTL_SECONDS = 30 * 24 * 60 * 60
+
+# A creature request is the same every time for a given difficulty, so the cache keeps
+# this many different answers for it and only starts picking among them once it has them all
+CREATURE_CACHE_VARIANTS = 8
+
+# Token budgets for each kind of answer; a creature fits in ~200 tokens and a
+# 3-5 turn battle log in ~400, so these leave headroom without letting the
+# model run on until the context fills
+CREATURE_NUM_PREDICT = 384
+BATTLE_NUM_PREDICT = 768
+
+# Added to those budgets when thinking is on (OLLAMA_THINK), since Ollama counts the
+# reasoning trace against num_predict and it usually runs longer than the answer
+THINKING_NUM_PREDICT = 2048
+
+# Challengers requested ahead of the battles that need them; capped in run_tournament
+# so that one request slot always stays free for the battle itself
+CHALLENGER_PREFETCH = 3
+
+# Prompt bodies are built once here; only the variable parts are formatted per call.
+# The fixed instructions go in the system prompt and the per-call details come last,
+# so consecutive requests share a prefix that Ollama can reuse from its KV cache.
+_CREATURE_SYSTEM = """Create a unique Pokemon-like creature with the following characteristics:
+- A creative name
+- One or two types (e.g., Fire, Water, Grass, Electric, Psychic, etc.)
+- A brief description of its appearance and behavior
+- 2-3 special abilities
+- Stats: HP, Attack, Defense, Speed (values between 30-100)
+
+Provide the response in JSON format with these fields: name, type, description, abilities (array), stats (hp, attack, defense, speed).
+"""
+
+_CREATURE_PROMPT = "Create the creature now. {difficulty_modifier}"
+
+# Difficulty modifier templates indexed by min(difficulty, 5); levels 0 and 1 add nothing
+_DIFFICULTY_MODIFIERS = (
+    "",
+    "",
+    "Make this creature moderately powerful (difficulty {difficulty}/5). ",
+    "Make this creature strong (difficulty {difficulty}/5). ",
+    "Make this creature very strong (difficulty {difficulty}/5). ",
+    "Make this creature extremely powerful, a true champion (difficulty {difficulty}/5). "
+)
+
+_BATTLE_SYSTEM = """Simulate a turn-by-turn battle between the two Pokemon-like creatures you are given.
+
+Consider type advantages, stats, abilities, and battle experience in your simulation.
+Describe the battle in 3-5 turns, showing damage dealt and any special effects.
+Declare a winner at the end.
+
+Provide the response in JSON format with these fields:
+- battle_log: array of strings describing each turn
+- winner: name of the winning creature
+- turns: number of turns the battle lasted
+"""
+
+# Sent after an answer that couldn't be decoded: first a cheap request to reformat it,
+# then, if that fails too, a fresh attempt that tells the model what went wrong
+_REPAIR_PROMPT = """Rewrite the following text as a single valid JSON object. Keep its content and add nothing else.
+
+{answer}"""
+
+_RETRY_PROMPT = """{prompt}
+
+Your previous answer could not be used ({error}):
+{answer}
+
+Reply again with the complete JSON object and nothing else."""
+
+# Stat keys every creature carries, in display order
+STAT_NAMES = ("hp", "attack", "defense", "speed")
+
+# JSON schemas passed as Ollama's "format", so the model can only produce answers of this shape
+_STAT_SCHEMA = {"type": "integer", "minimum": 30, "maximum": 100}
+
+_CREATURE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "name": {"type": "string"},
+        "type": {"type": "string"},
+        "description": {"type": "string"},
+        "abilities": {"type": "array", "items": {"type": "string"}, "minItems": 2, "maxItems": 3},
+        "stats": {
+            "type": "object",
+            "properties": {stat: _STAT_SCHEMA for stat in STAT_NAMES},
+            "required": list(STAT_NAMES)
+        }
+    },
+    "required": ["name", "type", "description", "abilities", "stats"]
+}
+
+_BATTLER_BLOCK = """Name: {name}
+Type: {type}
+Abilities: {abilities}
+Stats: {stats}
+Battle Record: {wins} wins, {losses} losses"""
+
+_BATTLE_PROMPT = """Creature 1:
+{creature1}
+
+Creature 2:
+{creature2}
+"""
+
+def encode_json(data) -> bytes:
+    """
+    Serialize data as indented JSON.
+    
+    Args:
+        data: The JSON-serializable data to encode
+        
+    Returns:
+        The UTF-8 encoded JSON document
+    """
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    return json.dumps(data, indent=2).encode("utf-8")
+
+def decode_json(data):
+    """
+    Parse a JSON document.
+    
+    Args:
+        data: The JSON text, as str or bytes
+        
+    Returns:
+        The decoded value
+        
+    Raises:
+        json.JSONDecodeError: If the data isn't valid JSON (orjson's error is a subclass)
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def write_file(filename: str, data: bytes, raise_errors: bool = True) -> bool:
+    """
+    Write bytes to a file.
+    
+    Args:
+        filename: The filename to save to
+        data: The bytes to write
+        raise_errors: Whether to raise on failure; if not, the failure is printed instead
+        
+    Returns:
+        True if the file was written
+    """
+    try:
+        with open(filename, "wb") as f:
+            f.write(data)
+    except OSError as e:
+        if raise_errors:
+            raise
+        print(f"Could not save {filename}: {e}")
+        return False
+    return True
+
+def json_line(data) -> bytes:
+    """
+    Serialize data as one line of JSON Lines.
+    
+    Args:
+        data: The JSON-serializable data to write
+        
+    Returns:
+        The compact JSON encoding followed by a newline
+    """
+    if orjson is not None:
+        return orjson.dumps(data) + b"\n"
+    return json.dumps(data).encode("utf-8") + b"\n"
+
+# Decodes one JSON value from a given offset and reports where it ended
+_JSON_DECODER = json.JSONDecoder()
+
+def json_object_end(response: str) -> int:
+    """
+    Find where the JSON object in a (possibly partial) model response ends.
+    
+    The object starts at the first "{", so code fences or prose around it are
+    skipped without a separate extraction pass.
+    
+    Args:
+        response: The response text received so far
+        
+    Returns:
+        The index just past the object's closing brace, or -1 if it isn't complete yet
+    """
+    start = response.find("{")
+    if start == -1:
+        return -1
+    try:
+        _, end = _JSON_DECODER.raw_decode(response, start)
+    except ValueError:
+        return -1
+    return end
+
+# Characters that change nesting depth or string state; everything else is skipped over
+_JSON_STRUCTURE = re.compile(r'[{}\[\]"\\]')
+
+class JsonObjectScanner:
+    """
+    Follow a streamed response chunk by chunk to spot where its first JSON object closes.
+    
+    Only nesting depth and whether the scan is inside a string are tracked, so each
+    chunk is scanned once instead of re-decoding everything received so far. A
+    depth of zero means the object might be complete; confirm with json_object_end.
+    """
+    
+    def __init__(self):
+        self._length = 0
+        self._depth = 0
+        self._started = False
+        self._in_string = False
+        # Offset into the next chunk after an escape that straddled a chunk boundary
+        self._skip = 0
+    
+    def feed(self, text: str) -> int:
+        """
+        Scan the next chunk of the response.
+        
+        Args:
+            text: The newly received text
+            
+        Returns:
+            The index in the whole response just past the object's closing brace,
+            or -1 if the object hasn't closed yet
+        """
+        offset = self._length
+        self._length += len(text)
+        pos, self._skip = self._skip, 0
+        while True:
+            match = _JSON_STRUCTURE.search(text, pos)
+            if match is None:
+                self._skip = max(pos - len(text), 0)
+                return -1
+            char = match.group()
+            pos = match.end()
+            if self._in_string:
+                if char == "\\":
+                    pos += 1
+                elif char == '"':
+                    self._in_string = False
+            elif not self._started:
+                # Text before the object (prose, a code fence) is ignored, as in json_object_end
+                if char == "{":
+                    self._started = True
+                    self._depth = 1
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    return offset + pos
+
+def is_complete_json(response: str) -> bool:
+    """
+    Check whether a (possibly partial) model response already holds a whole JSON object.
+    
+    Args:
+        response: The response text received so far
+        
+    Returns:
+        True if the object starting at the first "{" is complete
+    """
+    return json_object_end(response) != -1
+
+def load_json_object(response: str) -> Dict:
+    """
+    Decode the JSON object in a model response, ignoring any text around it.
+    
+    Args:
+        response: The raw response from Ollama
+        
+    Returns:
+        The decoded object
+        
+    Raises:
+        json.JSONDecodeError: If the response holds no complete JSON object
+    """
+    start = response.find("{")
+    if start == -1:
+        raise json.JSONDecodeError("No JSON object in response", response, 0)
+    # Streamed answers are cut right after the object, so usually nothing follows it
+    # and the whole tail can go to the faster parser
+    if orjson is not None and response.rstrip().endswith("}"):
+        try:
+            data = orjson.loads(response[start:])
+        except orjson.JSONDecodeError:
+            pass
+        else:
+            if isinstance(data, dict):
+                return data
+    data, _ = _JSON_DECODER.raw_decode(response, start)
+    return data
+
+# Timestamps have one-second resolution, so each second is only formatted once
+_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+_last_timestamp = (None, "")
+
+def timestamp() -> str:
+    """
+    Get the current local time formatted for battle results.
+    
+    Returns:
+        The time as "YYYY-MM-DD HH:MM:SS"
+    """
+    global _last_timestamp
+    now = int(time.time())
+    if _last_timestamp[0] != now:
+        # Replaced as one tuple, so a concurrent caller never sees a mismatched pair
+        _last_timestamp = (now, time.strftime(_TIMESTAMP_FORMAT, time.localtime(now)))
+    return _last_timestamp[1]
+
+def battle_schema(creature1: Dict, creature2: Dict) -> Dict:
+    """
+    Build the answer schema for a battle, limiting the winner to the two fighters.
+    
+    Args:
+        creature1: The first creature
+        creature2: The second creature
+        
+    Returns:
+        A JSON schema for Ollama's "format" field
+    """
+    return {
+        "type": "object",
+        "properties": {
+            "battle_log": {"type": "array", "items": {"type": "string"}, "minItems": 1},
+            "winner": {"type": "string", "enum": list(dict.fromkeys([creature1["name"], creature2["name"]]))},
+            "turns": {"type": "integer", "minimum": 1}
+        },
+        "required": ["battle_log", "winner", "turns"]
+    }
+
 class PokemonCreatureGenerator:
-    def __init__(self, ollama_url: Optional[str] = None, model: Optional[str] = None):
+    # Filled in when the model leaves them out, and used for creatures that fail to parse
+    DEFAULT_ABILITIES = ("Tackle", "Growl")
+    FALLBACK_ABILITIES = ("Tackle",)
+    FALLBACK_STATS = MappingProxyType(dict.fromkeys(STAT_NAMES, 50))
+    
+    def __init__(self, ollama_url: Optional[str] = None, model: Optional[str] = None,
+                 cache_dir: Optional[str] = None, num_parallel: Optional[int] = None,
+                 small_model: Optional[str] = None, verbose: Optional[bool] = None):
         """
         Initialize the Pokemon creature generator.
         
         Args:
             ollama_url: URL of your Ollama instance (will use OLLAMA_HOST from .env if not provided)
             model: The model to use in Ollama (will use OLLAMA_MODEL from .env if not provided)
+            cache_dir: Directory for cached Ollama responses (will use OLLAMA_CACHE_DIR from .env
+                if not provided). Caching is off when neither is set; with it on, creatures
+                come from a pool of CREATURE_CACHE_VARIANTS answers per difficulty.
+            num_parallel: Most requests to have in flight at once (will use OLLAMA_NUM_PARALLEL
+                from .env if not provided, default 4); match the server's setting
+            small_model: Model for mechanical follow-ups such as reformatting a malformed answer
+                (will use OLLAMA_SMALL_MODEL from .env, falling back to model). Only worth setting
+                if the server can keep both models loaded at once.
+            verbose: Whether to print every creature card and battle report (will use
+                TOURNAMENT_VERBOSE from .env if not provided, default on); turn off for
+                headless runs, which then only print tournament progress
         """
         # Use provided values, environment variables, or defaults
         self.ollama_url = ollama_url or os.getenv("OLLAMA_HOST", "http://localhost:11434/api/generate")
         self.model = model or os.getenv("OLLAMA_MODEL", "llama2")
+        self.small_model = small_model or os.getenv("OLLAMA_SMALL_MODEL") or self.model
+        self.num_parallel = num_parallel or int(os.getenv("OLLAMA_NUM_PARALLEL", "4"))
+        # Keep the model loaded between requests
+        self.keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+        # Skip thinking models' reasoning trace unless OLLAMA_THINK is set
+        self.think = os.getenv("OLLAMA_THINK", "false").lower() in ("1", "true", "yes")
+        # Same context size on every request, so Ollama never reloads the model
+        self.num_ctx = int(os.getenv("OLLAMA_NUM_CTX", "4096" if self.think else "2048"))
+        if verbose is None:
+            verbose = os.getenv("TOURNAMENT_VERBOSE", "true").lower() in ("1", "true", "yes")
+        self.verbose = verbose
+        self.cache_dir = cache_dir or os.getenv("OLLAMA_CACHE_DIR")
+        if self.cache_dir:
+            self.cache_dir = os.path.expanduser(self.cache_dir)
+            os.makedirs(self.cache_dir, exist_ok=True)
         
         print(f"Using Ollama URL: {self.ollama_url}")
         print(f"Using model: {self.model}")
+        if self.small_model != self.model:
+            print(f"Using small model: {self.small_model}")
+        if self.cache_dir:
+            print(f"Using response cache: {self.cache_dir}")
+        if not num_parallel and "OLLAMA_NUM_PARALLEL" not in os.environ:
+            print(f"OLLAMA_NUM_PARALLEL not set. Assuming the server handles {self.num_parallel} requests at once.")
+            print(f"To match: OLLAMA_NUM_PARALLEL={self.num_parallel} ollama serve")
+        
+        # Reuse connections, and retry connection errors and 5xx answers with backoff
+        self._session = requests.Session()
+        retries = Retry(
+            total=3,
+            backoff_factor=0.25,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset({"POST"}),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=16, max_retries=retries)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        
+        # Never have more requests in flight than the server runs at once
+        self._request_slots = threading.BoundedSemaphore(self.num_parallel)
+        # Long-lived workers for requests that run side by side
+        self._request_pool = ThreadPoolExecutor(max_workers=self.num_parallel)
+        
+        # Write save files in the background, in order
+        self._io_pool = ThreadPoolExecutor(max_workers=1)
         
         self.creatures = []
         self.current_generation = 0
+        # Uses of each creature name, so repeats can be numbered
+        self._name_counts = {}
+        # Tags this run's records in the append-only logs
+        self.run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        # Append-only logs of every creature and battle, written as they happen
+        self.creature_log_file = "pokemon_creatures.jsonl"
+        self._creature_log = None
         self.battles = []
+        self.battle_log_file = "pokemon_battles.jsonl"
+        self._battle_log = None
         self.champion = None
         self.running = True
         
@@ -44,30 +469,266 @@ class PokemonCreatureGenerator:
         """Handle Ctrl+C to exit gracefully."""
         print("\nReceived interrupt signal. Saving data and exiting...")
         self.running = False
+    
+    def close(self):
+        """Finish pending requests and saves, then close the connections to Ollama and the logs."""
+        self._request_pool.shutdown(wait=True)
+        self._io_pool.shutdown(wait=True)
+        self._session.close()
+        if self._creature_log is not None:
+            self._creature_log.close()
+            self._creature_log = None
+        if self._battle_log is not None:
+            self._battle_log.close()
+            self._battle_log = None
         
-    def query_ollama(self, prompt: str) -> str:
+    def __del__(self):
+        """Release the connections and files if close() was never called."""
+        if hasattr(self, "_creature_log"):
+            self.close()
+        
+    def query_ollama(self, prompt: str, system: Optional[str] = None, use_cache: bool = True,
+                     num_predict: Optional[int] = None,
+                     schema: Optional[Dict] = None, temperature: Optional[float] = None,
+                     model: Optional[str] = None, cache_variants: int = 1) -> Optional[str]:
         """
         Send a query to Ollama and return the response.
         
+        The response is streamed and cut at the end of its JSON object. Without a
+        schema, reading stops there and closing the stream makes Ollama stop
+        generating; with one, generation ends at the object anyway, so the stream is
+        read to the end and the connection can be reused.
+        
         Args:
             prompt: The prompt to send to Ollama
+            system: Optional system prompt; keep it identical across calls so Ollama can reuse its KV cache
+            use_cache: Whether to use the response cache for this request, reading and writing
+                (only applies when a cache_dir is set)
+            num_predict: Optional cap on the number of tokens Ollama generates
+            schema: Optional JSON schema the answer must follow (Ollama structured outputs)
+            temperature: Optional sampling temperature; the model's default is used if not given
+            model: Optional model to use instead of the generator's main model
+            cache_variants: How many different answers to collect for this request before
+                the cache serves a random one of them instead of asking the model
             
         Returns:
-            The response from Ollama
+            The response from Ollama, or None if the request failed (after the
+            session's own retries on connection errors and 5xx answers)
         """
+        payload = self._build_payload(prompt, system=system, num_predict=num_predict, schema=schema,
+                                      temperature=temperature, model=model)
+        
+        cache_key = self._cache_key(payload) if self.cache_dir and use_cache else None
+        if cache_key:
+            cached = self._read_cache(cache_key, variants=cache_variants)
+            if cached is not None:
+                return cached
+        
+        result = self._send(payload)
+        if result is None:
+            return None
+        
+        # Only keep answers worth replaying: a malformed one would just be retried again
+        if cache_key and is_complete_json(result):
+            self._write_cache(cache_key, result, variants=cache_variants)
+        return result
+    
+    def _build_payload(self, prompt: str, system: Optional[str] = None, num_predict: Optional[int] = None,
+                       schema: Optional[Dict] = None, temperature: Optional[float] = None,
+                       model: Optional[str] = None) -> Dict:
+        """Build the /api/generate request body; see query_ollama for the arguments."""
         payload = {
-            "model": self.model,
+            "model": model or self.model,
             "prompt": prompt,
-            "stream": False
+            "stream": True,
+            "think": self.think,
+            "keep_alive": self.keep_alive
         }
-        
+        if system:
+            payload["system"] = system
+        payload["options"] = {"num_ctx": self.num_ctx}
+        if num_predict:
+            payload["options"]["num_predict"] = num_predict
+        if temperature is not None:
+            payload["options"]["temperature"] = temperature
+        if schema:
+            payload["format"] = schema
+        return payload
+    
+    def _send(self, payload: Dict) -> Optional[str]:
+        """Send a request within the parallelism cap, returning None (after reporting it) if it fails."""
         try:
-            response = requests.post(self.ollama_url, json=payload)
-            response.raise_for_status()
-            return response.json().get("response", "")
-        except requests.exceptions.RequestException as e:
+            with self._request_slots:
+                return self._stream_response(payload)
+        except (requests.exceptions.RequestException, ValueError) as e:
             print(f"Error querying Ollama: {e}")
-            return ""
+            return None
+    
+    def _stream_response(self, payload: Dict) -> str:
+        """Read a streamed generation and return it up to the end of its JSON object."""
+        chunks = []
+        # Stopping early drops the connection, so only do it when the model may run on
+        scanner = None if "format" in payload else JsonObjectScanner()
+        with self._session.post(self.ollama_url, json=payload, stream=True) as response:
+            if not response.ok:
+                # Ollama says what went wrong (such as an unknown model) in the body
+                try:
+                    body = decode_json(response.content)
+                except ValueError:
+                    body = None
+                if isinstance(body, dict) and "error" in body:
+                    raise ValueError(body["error"])
+            response.raise_for_status()
+            for line in response.iter_lines(chunk_size=None):
+                if not line:
+                    continue
+                chunk = decode_json(line)
+                if "error" in chunk:
+                    raise ValueError(chunk["error"])
+                text = chunk.get("response", "")
+                chunks.append(text)
+                if scanner is not None and scanner.feed(text) != -1:
+                    received = "".join(chunks)
+                    end = json_object_end(received)
+                    if end != -1:
+                        # Drop whatever followed the object (often the start of a closing code fence)
+                        return received[:end]
+                    # The braces balance but the object is malformed; read the rest for query_json to handle
+                    scanner = None
+        received = "".join(chunks)
+        end = json_object_end(received)
+        return received[:end] if end != -1 else received
+    
+    def query_json(self, prompt: str, system: Optional[str] = None, retries: int = 2,
+                   num_predict: Optional[int] = None, schema: Optional[Dict] = None,
+                   cache_variants: int = 1) -> str:
+        """
+        Query Ollama, first repairing and then regenerating an answer that holds no complete JSON object.
+        
+        Args:
+            prompt: The prompt to send to Ollama
+            system: Optional system prompt
+            retries: How many extra attempts to make after a malformed answer
+            num_predict: Optional cap on the number of tokens in the answer; raised by
+                THINKING_NUM_PREDICT when thinking is on
+            schema: Optional JSON schema the answer must follow
+            cache_variants: How many different answers the cache collects for the first request
+            
+        Returns:
+            The last response from Ollama, or "" if a request failed
+        """
+        if num_predict and self.think:
+            num_predict += THINKING_NUM_PREDICT
+        options = {"system": system, "num_predict": num_predict, "schema": schema}
+        response = self.query_ollama(prompt, cache_variants=cache_variants, **options)
+        for attempt in range(retries):
+            if response is None:
+                break
+            try:
+                load_json_object(response)
+                break
+            except ValueError as e:
+                error = str(e) if response.strip() else "the answer was empty"
+            if attempt == 0 and response.strip():
+                response = self.query_ollama(_REPAIR_PROMPT.format(answer=response), use_cache=False,
+                                             num_predict=num_predict, schema=schema, temperature=0.0,
+                                             model=self.small_model)
+            else:
+                retry_prompt = _RETRY_PROMPT.format(prompt=prompt, answer=response, error=error)
+                response = self.query_ollama(retry_prompt, use_cache=False, **options)
+        return response or ""
+    
+    def _cache_key(self, payload: Dict) -> str:
+        """
+        Hash everything that affects the model output: model, prompts and options.
+        Transport settings (stream, keep_alive) are left out.
+        
+        Whitespace in the prompts is collapsed first, so prompts that differ only in
+        indentation or line breaks share an entry. The JSON encoding keeps field
+        boundaries unambiguous.
+        """
+        request = {key: value for key, value in payload.items() if key not in ("stream", "keep_alive")}
+        for field in ("prompt", "system"):
+            if field in request:
+                request[field] = " ".join(request[field].split())
+        return hashlib.sha256(json.dumps(request, sort_keys=True).encode("utf-8")).hexdigest()
+    
+    def _load_cache_entry(self, path: str) -> Optional[Dict]:
+        """Read a cache entry, or return None if it is missing, unreadable or expired (deleting it)."""
+        try:
+            with open(path, "rb") as f:
+                entry = decode_json(f.read())
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry.get("created", 0) > CACHE_TTL_SECONDS:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return entry
+    
+    def _read_cache(self, key: str, variants: int = 1) -> Optional[str]:
+        """
+        Return a cached response for a key, or None if missing, expired or still collecting.
+        
+        An entry counts as a hit once it holds `variants` answers; one of them is
+        picked at random. Only complete JSON answers are ever stored, so a pick
+        can be returned as is.
+        """
+        entry = self._load_cache_entry(os.path.join(self.cache_dir, f"{key}.json"))
+        if entry is None or len(entry["responses"]) < variants:
+            return None
+        return random.choice(entry["responses"])
+    
+    def _write_cache(self, key: str, response: str, variants: int = 1):
+        """Add a response to a key's collected answers while it has fewer than `variants`."""
+        path = os.path.join(self.cache_dir, f"{key}.json")
+        entry = self._load_cache_entry(path) if variants > 1 else None
+        if entry is None:
+            entry = {"created": time.time(), "responses": []}
+        if len(entry["responses"]) >= variants or response in entry["responses"]:
+            return
+        entry["responses"].append(response)
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(json_line(entry))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not write response cache: {e}")
+    
+    def warm_up(self) -> bool:
+        """
+        Load the model and prefill the creature instructions before the first real request.
+        
+        Generates a single token from the creature prompt, so the first creature
+        skips both the model load and the prefill of the shared system prompt.
+        The request bypasses the response cache.
+        
+        Returns:
+            True if the request went through, False if Ollama is unreachable or rejected it
+            (for example because the model isn't installed). The text of the answer doesn't
+            matter: a thinking model's single token may be thinking, leaving it empty.
+        """
+        payload = self._build_payload(self.create_creature_prompt(), system=_CREATURE_SYSTEM,
+                                      num_predict=1, schema=_CREATURE_SCHEMA)
+        return self._send(payload) is not None
+    
+    def create_creature_prompt(self, difficulty: int = 1) -> str:
+        """
+        Build the prompt used to generate a creature.
+        
+        Args:
+            difficulty: Difficulty level (1-5) to influence creature strength
+            
+        Returns:
+            The prompt to send to Ollama
+        """
+        # Adjust the prompt based on difficulty
+        modifier = _DIFFICULTY_MODIFIERS[max(min(difficulty, 5), 0)]
+        difficulty_modifier = modifier.format(difficulty=difficulty)
+        return _CREATURE_PROMPT.format(difficulty_modifier=difficulty_modifier).strip()
     
     def generate_creature(self, base_prompt: Optional[str] = None, difficulty: int = 1) -> Dict:
         """
@@ -80,92 +741,94 @@ class PokemonCreatureGenerator:
         Returns:
             A dictionary representing the generated creature
         """
-        self.current_generation += 1
-        
-        # Adjust the prompt based on difficulty
-        difficulty_modifier = ""
-        if difficulty >= 2:
-            difficulty_modifier = f"Make this creature moderately powerful (difficulty {difficulty}/5). "
-        if difficulty >= 3:
-            difficulty_modifier = f"Make this creature strong (difficulty {difficulty}/5). "
-        if difficulty >= 4:
-            difficulty_modifier = f"Make this creature very strong (difficulty {difficulty}/5). "
-        if difficulty >= 5:
-            difficulty_modifier = f"Make this creature extremely powerful, a true champion (difficulty {difficulty}/5). "
-            
-        prompt = base_prompt or f"""
-        Create a unique Pokemon-like creature with the following characteristics:
-        - A creative name
-        - One or two types (e.g., Fire, Water, Grass, Electric, Psychic, etc.)
-        - A brief description of its appearance and behavior
-        - 2-3 special abilities
-        - Stats: HP, Attack, Defense, Speed (values between 30-100)
+        if base_prompt:
+            response = self.query_json(base_prompt, num_predict=CREATURE_NUM_PREDICT, schema=_CREATURE_SCHEMA)
+        else:
+            response = self._query_creature(difficulty)
+        return self.parse_creature_response(response)
+    
+    def _query_creature(self, difficulty: int) -> str:
+        """Request a creature of the given difficulty and return the raw response."""
+        return self.query_json(self.create_creature_prompt(difficulty), system=_CREATURE_SYSTEM,
+                               num_predict=CREATURE_NUM_PREDICT, schema=_CREATURE_SCHEMA,
+                               cache_variants=CREATURE_CACHE_VARIANTS)
+    
+    def generate_creatures(self, count: int, difficulty: int = 1) -> List[Dict]:
+        """
+        Generate several creatures with their Ollama requests in flight at once.
         
-        {difficulty_modifier}
+        The requests don't depend on each other, so they are sent concurrently and
+        Ollama can serve them in parallel (see OLLAMA_NUM_PARALLEL). The creatures
+        are registered in request order once every response has arrived.
         
-        Provide the response in JSON format with these fields: name, type, description, abilities (array), stats (hp, attack, defense, speed).
+        Args:
+            count: Number of creatures to generate
+            difficulty: Difficulty level (1-5) to influence creature strength
+            
+        Returns:
+            The generated creatures, in request order
         """
+        responses = self._request_pool.map(self._query_creature, [difficulty] * count)
+        return [self.parse_creature_response(response) for response in responses]
+    
+    def parse_creature_response(self, response: str) -> Dict:
+        """
+        Turn an Ollama response into a creature and add it to the roster.
         
-        response = self.query_ollama(prompt)
+        Args:
+            response: The raw response from Ollama
+            
+        Returns:
+            A dictionary representing the generated creature
+        """
+        self.current_generation += 1
+        creature_id = len(self.creatures) + 1
         
         # Try to parse the response as JSON
         try:
             # Sometimes the model might add extra text, so we'll try to extract JSON
-            if "```json" in response:
-                json_str = response.split("```json")[1].split("```")[0].strip()
-            elif "```" in response:
-                json_str = response.split("```")[1].strip()
-            else:
-                json_str = response.strip()
-                
-            creature_data = json.loads(json_str)
-            
-            # Add some metadata
-            creature_data["id"] = len(self.creatures) + 1
-            creature_data["generation"] = self.current_generation
+            creature_data = load_json_object(response)
             
             # Ensure we have all required fields
-            if "stats" not in creature_data:
-                creature_data["stats"] = {
-                    "hp": random.randint(30, 100),
-                    "attack": random.randint(30, 100),
-                    "defense": random.randint(30, 100),
-                    "speed": random.randint(30, 100)
-                }
+            creature_data.setdefault("name", f"Creature-{creature_id}")
+            stats = creature_data.setdefault("stats", {})
+            for stat in STAT_NAMES:
+                if stat not in stats:
+                    stats[stat] = random.randint(30, 100)
                 
             if "abilities" not in creature_data:
-                creature_data["abilities"] = ["Tackle", "Growl"]
-                
-            # Add battle stats
-            creature_data["wins"] = 0
-            creature_data["losses"] = 0
-            creature_data["total_battles"] = 0
-            
-            self.creatures.append(creature_data)
-            return creature_data
+                creature_data["abilities"] = list(self.DEFAULT_ABILITIES)
             
         except json.JSONDecodeError:
             print("Failed to parse JSON from response. Raw response:")
             print(response)
             
-            # Return a fallback creature
-            return {
-                "id": len(self.creatures) + 1,
-                "name": f"Creature-{len(self.creatures) + 1}",
+            # Use a fallback creature, registered like any other so ids and names stay unique
+            creature_data = {
+                "name": f"Creature-{creature_id}",
                 "type": "Unknown",
                 "description": "A mysterious creature that couldn't be properly generated.",
-                "abilities": ["Tackle"],
-                "stats": {
-                    "hp": 50,
-                    "attack": 50,
-                    "defense": 50,
-                    "speed": 50
-                },
-                "generation": self.current_generation,
-                "wins": 0,
-                "losses": 0,
-                "total_battles": 0
+                "abilities": list(self.FALLBACK_ABILITIES),
+                "stats": dict(self.FALLBACK_STATS)
             }
+        
+        # Add some metadata
+        creature_data["id"] = creature_id
+        creature_data["generation"] = self.current_generation
+        name = creature_data["name"]
+        count = self._name_counts.get(name, 0) + 1
+        self._name_counts[name] = count
+        if count > 1:
+            creature_data["name"] = f"{name} {count}"
+        
+        # Add battle stats
+        creature_data["wins"] = 0
+        creature_data["losses"] = 0
+        creature_data["total_battles"] = 0
+        
+        self.creatures.append(creature_data)
+        self.log_creature(creature_data)
+        return creature_data
     
     def simulate_battle(self, creature1: Dict, creature2: Dict) -> Dict:
         """
@@ -178,61 +841,28 @@ class PokemonCreatureGenerator:
         Returns:
             A dictionary containing the battle result
         """
-        prompt = f"""
-        Simulate a turn-by-turn battle between these two Pokemon-like creatures:
+        prompt = _BATTLE_PROMPT.format(
+            creature1=self._format_battler(creature1),
+            creature2=self._format_battler(creature2)
+        )
         
-        Creature 1:
-        Name: {creature1['name']}
-        Type: {creature1['type']}
-        Abilities: {creature1['abilities']}
-        Stats: {creature1['stats']}
-        Battle Record: {creature1.get('wins', 0)} wins, {creature1.get('losses', 0)} losses
-        
-        Creature 2:
-        Name: {creature2['name']}
-        Type: {creature2['type']}
-        Abilities: {creature2['abilities']}
-        Stats: {creature2['stats']}
-        Battle Record: {creature2.get('wins', 0)} wins, {creature2.get('losses', 0)} losses
-        
-        Consider type advantages, stats, abilities, and battle experience in your simulation.
-        Describe the battle in 3-5 turns, showing damage dealt and any special effects.
-        Declare a winner at the end.
-        
-        Provide the response in JSON format with these fields:
-        - battle_log: array of strings describing each turn
-        - winner: name of the winning creature
-        - turns: number of turns the battle lasted
-        """
-        
-        response = self.query_ollama(prompt)
+        response = self.query_json(prompt, system=_BATTLE_SYSTEM, num_predict=BATTLE_NUM_PREDICT,
+                                   schema=battle_schema(creature1, creature2))
         
         try:
             # Extract JSON from the response
-            if "```json" in response:
-                json_str = response.split("```json")[1].split("```")[0].strip()
-            elif "```" in response:
-                json_str = response.split("```")[1].strip()
-            else:
-                json_str = response.strip()
-                
-            battle_result = json.loads(json_str)
+            battle_result = load_json_object(response)
             
             # Add metadata
             battle_result["creature1_id"] = creature1["id"]
             battle_result["creature2_id"] = creature2["id"]
-            battle_result["timestamp"] = time.strftime("%Y-%m-%d %H:%M:%S")
+            battle_result["timestamp"] = timestamp()
             
             # Update battle records
             if battle_result["winner"] == creature1["name"]:
-                creature1["wins"] = creature1.get("wins", 0) + 1
-                creature2["losses"] = creature2.get("losses", 0) + 1
+                self._record_battle(creature1, creature2)
             else:
-                creature2["wins"] = creature2.get("wins", 0) + 1
-                creature1["losses"] = creature1.get("losses", 0) + 1
-                
-            creature1["total_battles"] = creature1.get("total_battles", 0) + 1
-            creature2["total_battles"] = creature2.get("total_battles", 0) + 1
+                self._record_battle(creature2, creature1)
             
             return battle_result
             
@@ -240,19 +870,12 @@ class PokemonCreatureGenerator:
             print("Failed to parse battle JSON from response. Raw response:")
             print(response)
             
-            # Return a fallback battle result
-            winner = creature1["name"] if creature1["stats"]["attack"] > creature2["stats"]["attack"] else creature2["name"]
-            
-            # Update battle records
-            if winner == creature1["name"]:
-                creature1["wins"] = creature1.get("wins", 0) + 1
-                creature2["losses"] = creature2.get("losses", 0) + 1
+            # Return a fallback battle result, won by the stronger attacker
+            if creature1["stats"]["attack"] > creature2["stats"]["attack"]:
+                winner, loser = creature1, creature2
             else:
-                creature2["wins"] = creature2.get("wins", 0) + 1
-                creature1["losses"] = creature1.get("losses", 0) + 1
-                
-            creature1["total_battles"] = creature1.get("total_battles", 0) + 1
-            creature2["total_battles"] = creature2.get("total_battles", 0) + 1
+                winner, loser = creature2, creature1
+            self._record_battle(winner, loser)
             
             return {
                 "battle_log": [
@@ -260,34 +883,92 @@ class PokemonCreatureGenerator:
                     f"{creature2['name']} retaliates!",
                     f"The battle is intense!"
                 ],
-                "winner": winner,
+                "winner": winner["name"],
                 "turns": 3,
                 "creature1_id": creature1["id"],
                 "creature2_id": creature2["id"],
-                "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+                "timestamp": timestamp()
             }
     
-    def save_creatures_to_json(self, filename: str = "pokemon_creatures.json"):
+    @staticmethod
+    def _record_battle(winner: Dict, loser: Dict):
+        """Update both creatures' battle records after a fight."""
+        winner["wins"] = winner.get("wins", 0) + 1
+        loser["losses"] = loser.get("losses", 0) + 1
+        winner["total_battles"] = winner.get("total_battles", 0) + 1
+        loser["total_battles"] = loser.get("total_battles", 0) + 1
+    
+    def _format_battler(self, creature: Dict) -> str:
+        """Fill in the battle prompt's description of one fighter."""
+        return _BATTLER_BLOCK.format(
+            name=creature['name'],
+            type=creature['type'],
+            abilities=creature['abilities'],
+            stats=creature['stats'],
+            wins=creature.get('wins', 0),
+            losses=creature.get('losses', 0)
+        )
+    
+    def log_creature(self, creature: Dict):
+        """
+        Append a newly created creature to the JSON Lines creature log, tagged with the run id.
+        
+        Like a synchronous save, a failed write raises.
+        
+        Args:
+            creature: The creature dictionary to log
+        """
+        if self._creature_log is None:
+            self._creature_log = open(self.creature_log_file, "ab")
+        self._creature_log.write(json_line({"run_id": self.run_id, **creature}))
+        self._creature_log.flush()
+    
+    def log_battle(self, battle_result: Dict):
+        """
+        Append a battle result to the JSON Lines battle log, tagged with the run id.
+        
+        Like a synchronous save, a failed write raises.
+        
+        Args:
+            battle_result: The battle result dictionary to log
+        """
+        if self._battle_log is None:
+            self._battle_log = open(self.battle_log_file, "ab")
+        self._battle_log.write(json_line({"run_id": self.run_id, **battle_result}))
+        self._battle_log.flush()
+    
+    def save_creatures_to_json(self, filename: str = "pokemon_creatures.json", background: bool = False):
         """
         Save all generated creatures to a JSON file.
         
         Args:
             filename: The filename to save to
+            background: Return once the data is serialized and let the write finish in the background;
+                a failure is then printed instead of raised
         """
-        with open(filename, "w") as f:
-            json.dump(self.creatures, f, indent=2)
-        print(f"Saved {len(self.creatures)} creatures to {filename}")
+        self._save_file(filename, encode_json(self.creatures), background,
+                        f"Saved {len(self.creatures)} creatures to {filename}")
         
-    def save_battles_to_json(self, filename: str = "pokemon_battles.json"):
+    def save_battles_to_json(self, filename: str = "pokemon_battles.json", background: bool = False):
         """
         Save all battle results to a JSON file.
         
         Args:
             filename: The filename to save to
+            background: Return once the data is serialized and let the write finish in the background;
+                a failure is then printed instead of raised
         """
-        with open(filename, "w") as f:
-            json.dump(self.battles, f, indent=2)
-        print(f"Saved {len(self.battles)} battles to {filename}")
+        self._save_file(filename, encode_json(self.battles), background,
+                        f"Saved {len(self.battles)} battles to {filename}")
+    
+    def _save_file(self, filename: str, data: bytes, background: bool, summary: str):
+        """Queue a write on the I/O thread, printing the summary once written; waits unless in the background."""
+        def save():
+            if write_file(filename, data, raise_errors=not background):
+                print(summary)
+        future = self._io_pool.submit(save)
+        if not background:
+            future.result()
     
     def print_creature(self, creature: Dict, is_champion: bool = False):
         """
@@ -297,29 +978,29 @@ class PokemonCreatureGenerator:
             creature: The creature dictionary to print
             is_champion: Whether this creature is the current champion
         """
+        if not self.verbose:
+            return
+        lines = []
         if is_champion:
-            print("🏆 CURRENT CHAMPION 🏆")
-            print("=" * 40)
+            lines.append("🏆 CURRENT CHAMPION 🏆")
+            lines.append("=" * 40)
             
-        print(f"ID: {creature['id']}")
-        print(f"Name: {creature['name']}")
-        print(f"Type: {creature['type']}")
-        print(f"Description: {creature['description']}")
-        print("Abilities:")
-        for ability in creature['abilities']:
-            print(f"  - {ability}")
-        print("Stats:")
-        for stat, value in creature['stats'].items():
-            print(f"  - {stat.capitalize()}: {value}")
-        print("Battle Record:")
-        print(f"  - Wins: {creature.get('wins', 0)}")
-        print(f"  - Losses: {creature.get('losses', 0)}")
-        print(f"  - Total Battles: {creature.get('total_battles', 0)}")
+        lines.append(f"ID: {creature['id']}")
+        lines.append(f"Name: {creature['name']}")
+        lines.append(f"Type: {creature['type']}")
+        lines.append(f"Description: {creature['description']}")
+        lines.append("Abilities:")
+        lines.extend(f"  - {ability}" for ability in creature['abilities'])
+        lines.append("Stats:")
+        lines.extend(f"  - {stat.capitalize()}: {value}" for stat, value in creature['stats'].items())
+        lines.append("Battle Record:")
+        lines.append(f"  - Wins: {creature.get('wins', 0)}")
+        lines.append(f"  - Losses: {creature.get('losses', 0)}")
+        lines.append(f"  - Total Battles: {creature.get('total_battles', 0)}")
+        lines.append("=" * 40 if is_champion else "-" * 40)
         
-        if is_champion:
-            print("=" * 40)
-        else:
-            print("-" * 40)
+        # One write for the whole card instead of one per line
+        print("\n".join(lines))
     
     def print_battle(self, battle_result: Dict):
         """
@@ -328,28 +1009,51 @@ class PokemonCreatureGenerator:
         Args:
             battle_result: The battle result dictionary
         """
-        print(f"\n⚔️ BATTLE #{len(self.battles) + 1} ⚔️")
-        print("-" * 40)
+        if not self.verbose:
+            return
+        lines = [f"\n⚔️ BATTLE #{len(self.battles) + 1} ⚔️", "-" * 40]
+        lines.extend(f"Turn {i}: {log_entry}" for i, log_entry in enumerate(battle_result["battle_log"], 1))
+        lines.append("-" * 40)
+        lines.append(f"🏆 Winner: {battle_result['winner']} after {battle_result['turns']} turns!")
+        lines.append(f"Battle took place on {battle_result['timestamp']}")
+        lines.append("-" * 40)
         
-        for i, log_entry in enumerate(battle_result["battle_log"], 1):
-            print(f"Turn {i}: {log_entry}")
-            
-        print("-" * 40)
-        print(f"🏆 Winner: {battle_result['winner']} after {battle_result['turns']} turns!")
-        print(f"Battle took place on {battle_result['timestamp']}")
-        print("-" * 40)
+        # One write for the whole report instead of one per line
+        print("\n".join(lines))
     
-    def run_tournament(self):
+    @staticmethod
+    def challenger_difficulty(battle_count: int) -> int:
+        """Difficulty of the challenger in a given battle: 2 at the start, one more every 5 battles, up to 5."""
+        return min(2 + battle_count // 5, 5)
+    
+    def run_tournament(self, rate_limit_qps: Optional[float] = None):
         """
         Run an infinite tournament where the champion battles against increasingly powerful challengers.
+        
+        Args:
+            rate_limit_qps: Optional cap on battle rounds per second. A round that finishes
+                early waits out the rest of its 1/rate_limit_qps interval, and a slower one
+                is followed straight away. Rounds run back to back by default; Ollama
+                queues requests on its own.
         """
         print("🎮 POKEMON CREATURE EVOLUTION TOURNAMENT 🎮")
         print("=" * 50)
+        print("Loading model...")
+        # Stop here rather than fill the tournament with fallback creatures
+        if not self.warm_up():
+            print(f"The warm-up request for {self.model} at {self.ollama_url} failed.")
+            print("Check that Ollama is running and the model is pulled (ollama pull <model>).")
+            return
         print("Generating initial creatures...")
         
-        # Generate the first two creatures
-        creature1 = self.generate_creature(difficulty=2)
-        creature2 = self.generate_creature(difficulty=2)
+        # Generate the first two creatures side by side
+        creature1, creature2 = self.generate_creatures(2, difficulty=2)
+        
+        # Challengers don't depend on who wins, so the next few are requested while
+        # battles run; only parsing waits for the main thread
+        prefetch = max(1, min(CHALLENGER_PREFETCH, self.num_parallel - 1))
+        upcoming = deque(self._request_pool.submit(self._query_creature, self.challenger_difficulty(n))
+                         for n in range(2, 2 + prefetch))
         
         print("\nInitial creatures:")
         self.print_creature(creature1)
@@ -360,6 +1064,7 @@ class PokemonCreatureGenerator:
         battle_result = self.simulate_battle(creature1, creature2)
         self.print_battle(battle_result)
         self.battles.append(battle_result)
+        self.log_battle(battle_result)
         
         # Set the champion
         if battle_result["winner"] == creature1["name"]:
@@ -375,21 +1080,25 @@ class PokemonCreatureGenerator:
         difficulty = 2
         
         while self.running:
+            round_start = time.monotonic()
             battle_count += 1
             
             # Gradually increase difficulty
-            if battle_count % 5 == 0 and difficulty < 5:
-                difficulty += 1
+            if self.challenger_difficulty(battle_count) > difficulty:
+                difficulty = self.challenger_difficulty(battle_count)
                 print(f"\n⚠️ DIFFICULTY INCREASED TO {difficulty}/5! ⚠️")
             
             print(f"\nGenerating challenger #{battle_count} (Difficulty: {difficulty}/5)...")
-            challenger = self.generate_creature(difficulty=difficulty)
+            challenger = self.parse_creature_response(upcoming.popleft().result())
+            upcoming.append(self._request_pool.submit(self._query_creature,
+                                                      self.challenger_difficulty(battle_count + prefetch)))
             self.print_creature(challenger)
             
             print(f"\nBattle #{battle_count}: Champion vs Challenger")
             battle_result = self.simulate_battle(self.champion, challenger)
             self.print_battle(battle_result)
             self.battles.append(battle_result)
+            self.log_battle(battle_result)
             
             # Check if the champion was defeated
             if battle_result["winner"] != self.champion["name"]:
@@ -404,15 +1113,22 @@ class PokemonCreatureGenerator:
                 print(f"\n✅ The champion {self.champion['name']} defends their title!")
                 print(f"The champion now has {self.champion.get('wins', 0)} victories.")
                 
-            # Save progress every 5 battles
+            # Save progress every 5 battles; battles are already in the battle log, but
+            # creature records change with every fight, so the roster is rewritten
             if battle_count % 5 == 0:
-                self.save_creatures_to_json()
-                self.save_battles_to_json()
-                print(f"\n💾 Progress saved after {battle_count} battles.")
+                self.save_creatures_to_json(background=True)
+                print(f"\n💾 Saving progress after {battle_count} battles...")
                 
-            # Small delay to prevent overwhelming Ollama
-            time.sleep(1)
+            # Only pace the rounds when a rate limit was asked for, counting the round's own time
+            if rate_limit_qps:
+                remaining = 1 / rate_limit_qps - (time.monotonic() - round_start)
+                if remaining > 0:
+                    time.sleep(remaining)
             
+        # Challengers for battles that won't happen are dropped unless already underway
+        for future in upcoming:
+            future.cancel()
+        
         # Save final state
         self.save_creatures_to_json()
         self.save_battles_to_json()
@@ -425,4 +1141,7 @@ if __name__ == "__main__":
     generator = PokemonCreatureGenerator()
     
     # Run the tournament
-    generator.run_tournament()
\ No newline at end of file
+    try:
+        generator.run_tournament()
+    finally:
+        generator.close()
\ No newline at end of file